@@ -1,6 +1,6 @@
 # app/api/dependencies.py
-from typing import Any, Type, Callable
-from fastapi import Depends, HTTPException, status
+from typing import Any, Type, Callable, Optional
+from fastapi import Depends, Header, HTTPException, status
 from sqlalchemy.orm import Session
 
 from app.database import get_db
@@ -24,6 +24,15 @@ def get_service(service_class: Type) -> Callable:
         return service_class(db)
     return _get_service
 
+def get_idempotency_key(
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+) -> Optional[str]:
+    """
+    Client-supplied key for one purchase attempt (generated per button click).
+    Retries that resend it get the same checkout session; a new attempt sends a new key.
+    """
+    return idempotency_key
+
 def get_character_owner(
     character_id: str,
     current_user: Player = Depends(get_current_user),
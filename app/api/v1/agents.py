@@ -5,7 +5,7 @@ from typing import List, Optional, Dict, Any
 from app.database import get_db
 from app.schemas import AgentBase, AgentCreate, AgentResponse, AgentUpdate, AgentList
 from app.api.auth import get_current_user
-from app.api.dependencies import get_service
+from app.api.dependencies import get_service, get_idempotency_key
 from app.services.agent_service import AgentService
 from app.services.zone_service import ZoneService
 from app.services.world_service import WorldService
@@ -339,6 +339,7 @@ async def create_agent_tier_upgrade_checkout(
     success_url: str = Query(..., description="URL to redirect after successful payment"),
     cancel_url: str = Query(..., description="URL to redirect if payment is canceled"),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     agent_service: AgentService = Depends(get_service(AgentService)),
     zone_service: ZoneService = Depends(get_service(ZoneService)),
     world_service: WorldService = Depends(get_service(WorldService)),
@@ -379,11 +380,12 @@ async def create_agent_tier_upgrade_checkout(
         )
     
     try:
-        checkout_url = payment_service.create_entity_tier_upgrade_checkout(
+        checkout_url = await payment_service.create_entity_tier_upgrade_checkout(
             user_id=current_user.id,
             entity_id=agent.character.id,
             success_url=success_url,
-            cancel_url=cancel_url
+            cancel_url=cancel_url,
+            idempotency_key=idempotency_key
         )
         return {"checkout_url": checkout_url}
     
@@ -13,7 +13,7 @@ from app.schemas import (
     CharacterList
 )
 from app.api.auth import get_current_user
-from app.api.dependencies import get_service
+from app.api.dependencies import get_service, get_idempotency_key
 from app.api.premium import require_premium, check_character_limit, check_public_character_permission
 from app.services.character_service import CharacterService
 from app.services.usage_service import UsageService
@@ -378,6 +378,7 @@ async def create_character_tier_upgrade_checkout(
     success_url: str = Query(..., description="URL to redirect after successful payment"),
     cancel_url: str = Query(..., description="URL to redirect if payment is canceled"),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     character_service: CharacterService = Depends(get_service(CharacterService)),
     payment_service: PaymentService = Depends(get_service(PaymentService))
 ):
@@ -403,11 +404,12 @@ async def create_character_tier_upgrade_checkout(
             detail="Character cannot be upgraded (missing associated entity)"
         )
     try:
-        checkout_url = payment_service.create_entity_tier_upgrade_checkout(
+        checkout_url = await payment_service.create_entity_tier_upgrade_checkout(
             user_id=current_user.id,
             entity_id=character.id,
             success_url=success_url,
-            cancel_url=cancel_url
+            cancel_url=cancel_url,
+            idempotency_key=idempotency_key
         )
         return {"checkout_url": checkout_url}
     except ValueError as e:
@@ -5,7 +5,7 @@ from typing import List, Optional, Dict, Any
 from app.database import get_db
 from app.schemas import ObjectBase, ObjectCreate, ObjectList, ObjectResponse, ObjectUpdate
 from app.api.auth import get_current_user
-from app.api.dependencies import get_service
+from app.api.dependencies import get_service, get_idempotency_key
 from app.services.object_service import ObjectService
 from app.services.zone_service import ZoneService
 from app.services.world_service import WorldService
@@ -77,6 +77,7 @@ async def list_objects(
     page_size: int = Query(20, ge=1, le=100),
     sort_by: str = Query("name"),
     sort_desc: bool = Query(False),
+    skip_count: bool = Query(False, description="Skip the total count and return has_next instead"),
     current_user: User = Depends(get_current_user),
     object_service: ObjectService = Depends(get_service(ObjectService)),
     zone_service: ZoneService = Depends(get_service(ZoneService)),
@@ -89,6 +90,9 @@ async def list_objects(
       - zone_id: Return objects in the given zone.
       - world_id: Return objects in the given world (validated via the associated zone).
       - name: Filter by object name.
+    
+    With skip_count the total is not computed: total and total_pages are
+    null and has_next tells whether another page follows.
     """
     filters: Dict[str, Any] = {}
     if name:
@@ -122,6 +126,22 @@ async def list_objects(
             )
         filters['world_id'] = world_id
 
+    if skip_count:
+        objects, _, has_next = object_service.get_objects(
+            filters=filters,
+            page=page,
+            page_size=page_size,
+            sort_by=sort_by,
+            sort_desc=sort_desc,
+            exact_count=False
+        )
+        return {
+            "items": objects,
+            "page": page,
+            "page_size": page_size,
+            "has_next": has_next
+        }
+    
     objects, total_count, total_pages = object_service.get_objects(
         filters=filters,
         page=page,
@@ -317,6 +337,7 @@ async def search_objects(
     world_id: Optional[str] = Query(None, description="Filter search to a specific world"),
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    skip_count: bool = Query(False, description="Skip the total count and return has_next instead"),
     current_user: User = Depends(get_current_user),
     object_service: ObjectService = Depends(get_service(ObjectService)),
     zone_service: ZoneService = Depends(get_service(ZoneService)),
@@ -324,6 +345,8 @@ async def search_objects(
 ):
     """
     Search for objects by name or description.
+    
+    skip_count behaves as in list_objects.
     """
     if zone_id:
         zone = zone_service.get_zone(zone_id)
@@ -344,8 +367,24 @@ async def search_objects(
                 detail="You don't have access to this world"
             )
     
+    if skip_count:
+        objects, _, has_next = object_service.search_objects(
+            query_str=query,
+            zone_id=zone_id,
+            world_id=world_id,
+            page=page,
+            page_size=page_size,
+            exact_count=False
+        )
+        return {
+            "items": objects,
+            "page": page,
+            "page_size": page_size,
+            "has_next": has_next
+        }
+    
     objects, total_count, total_pages = object_service.search_objects(
-        query=query,
+        query_str=query,
         zone_id=zone_id,
         world_id=world_id,
         page=page,
@@ -366,6 +405,7 @@ async def create_object_tier_upgrade_checkout(
     success_url: str = Query(..., description="URL to redirect after successful payment"),
     cancel_url: str = Query(..., description="URL to redirect if payment is canceled"),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     object_service: ObjectService = Depends(get_service(ObjectService)),
     zone_service: ZoneService = Depends(get_service(ZoneService)),
     world_service: WorldService = Depends(get_service(WorldService)),
@@ -396,17 +436,13 @@ async def create_object_tier_upgrade_checkout(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Only administrators can upgrade unassigned objects"
         )
-    if not obj.entity_id:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Object cannot be upgraded (no associated entity)"
-        )
     try:
-        checkout_url = payment_service.create_entity_tier_upgrade_checkout(
+        checkout_url = await payment_service.create_entity_tier_upgrade_checkout(
             user_id=current_user.id,
-            entity_id=obj.entity_id,
+            entity_id=obj.id,
             success_url=success_url,
-            cancel_url=cancel_url
+            cancel_url=cancel_url,
+            idempotency_key=idempotency_key
         )
         return {"checkout_url": checkout_url}
     except ValueError as e:
@@ -1,16 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Body
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request, Body
 import stripe
 import logging
 from typing import List, Dict, Any, Optional
 
-from app.database import get_db
 # from app.api import schemas  # our schemas module from above
 from app.api.auth import get_current_user
-from app.api.dependencies import get_service
+from app.api.dependencies import get_service, get_idempotency_key
 from app.models.player import Player as User
 from app.schemas.subscriptions import CheckoutResponse, PortalResponse, SubscriptionInfoResponse, SubscriptionPlanResponse
-from app.services.payment_service import PaymentService
+from app.services.payment_service import PaymentService, process_stripe_event, record_stripe_event
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
@@ -40,17 +38,19 @@ async def create_checkout_session(
     success_url: str = Body(..., embed=True),
     cancel_url: str = Body(..., embed=True),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     payment_service: PaymentService = Depends(get_service(PaymentService))
 ):
     """
     Create a checkout session for a subscription purchase.
     """
     try:
-        checkout_url = payment_service.create_subscription_checkout(
+        checkout_url = await payment_service.create_subscription_checkout(
             user_id=current_user.id,
             plan_id=plan_id,
             success_url=success_url,
-            cancel_url=cancel_url
+            cancel_url=cancel_url,
+            idempotency_key=idempotency_key
         )
         return {"checkout_url": checkout_url}
     
@@ -76,7 +76,7 @@ async def create_billing_portal_session(
     Create a billing portal session for managing subscriptions.
     """
     try:
-        portal_url = payment_service.create_billing_portal_session(
+        portal_url = await payment_service.create_billing_portal_session(
             user_id=current_user.id,
             return_url=return_url
         )
@@ -100,13 +100,17 @@ async def create_billing_portal_session(
 @router.post("/webhook", status_code=status.HTTP_200_OK)
 async def stripe_webhook(
     request: Request,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks
 ):
     """
     Webhook endpoint for Stripe events.
     
+    Verifies the signature, records the event in stripe_events and acknowledges
+    it; the event is applied in a background task after the response is sent.
     Handles events such as checkout.session.completed,
     customer.subscription.updated, and customer.subscription.deleted.
+    Events whose processing fails transiently are retried by the sweeper, and
+    redeliveries of events already on record are not processed again.
     """
     webhook_secret = settings.STRIPE_WEBHOOK_SECRET
     signature = request.headers.get("stripe-signature")
@@ -136,38 +140,18 @@ async def stripe_webhook(
             detail="Invalid signature"
         )
     
-    payment_service = PaymentService(db)
-    
+    # Only an event that could not be stored gets an error status, so Stripe redelivers it
     try:
-        event_type = event["type"]
-        if event_type == "checkout.session.completed":
-            session = event["data"]["object"]
-            product_type = session.metadata.get("product_type")
-            
-            if product_type == "zone_upgrade":
-                payment_service.handle_zone_upgrade_checkout_completed(session.id)
-            elif product_type == "premium_world":
-                payment_service.handle_premium_world_checkout_completed(session.id)
-            elif product_type == "entity_limit_upgrade":
-                payment_service.handle_entity_limit_upgrade_checkout_completed(session.id)
-            else:
-                # Default to handling as a subscription checkout session
-                payment_service.handle_subscription_checkout_completed(session.id)
-        
-        elif event_type == "customer.subscription.updated":
-            subscription = event["data"]["object"]
-            payment_service.handle_subscription_updated(subscription.id)
-            
-        elif event_type == "customer.subscription.deleted":
-            subscription = event["data"]["object"]
-            payment_service.handle_subscription_deleted(subscription.id)
-        
-        return {"status": "success"}
-        
+        is_new = record_stripe_event(event, payload)
     except Exception as e:
-        logger.error(f"Error handling Stripe webhook: {str(e)}")
-        # Return 200 to prevent retries from Stripe even on errors.
-        return {"status": "error", "message": str(e)}
+        logger.error(f"Failed to record Stripe event {event['id']}: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to record event"
+        )
+    if is_new:
+        background_tasks.add_task(process_stripe_event, event["id"])
+    return {"status": "success"}
 
 @router.get("/subscription", response_model=SubscriptionInfoResponse)
 async def get_subscription_info(
@@ -177,7 +161,8 @@ async def get_subscription_info(
     """
     Get current user's subscription information.
     """
-    subscription = payment_service.get_user_subscription(current_user.id)
+    # The response serializes the plan, so load it in the same query
+    subscription = payment_service.get_user_subscription(current_user.id, with_plan=True)
     if not subscription:
         return {"is_premium": False, "subscription": None}
     
@@ -194,7 +179,7 @@ async def cancel_subscription(
     """
     Cancel the current user's subscription.
     """
-    success = payment_service.cancel_subscription(current_user.id)
+    success = await payment_service.cancel_subscription(current_user.id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
@@ -5,7 +5,7 @@ from typing import Any, Dict, List, Optional
 from app.database import get_db
 from app.schemas import WorldList, WorldBase, WorldCreate, WorldResponse, WorldUpdate
 from app.api.auth import get_current_user
-from app.api.dependencies import get_service
+from app.api.dependencies import get_service, get_idempotency_key
 from app.services.world_service import WorldService
 from app.services.payment_service import PaymentService
 from app.models.player import Player as User
@@ -268,6 +268,7 @@ async def create_world_tier_upgrade_checkout(
     success_url: str = Body(..., embed=True),
     cancel_url: str = Body(..., embed=True),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     payment_service: PaymentService = Depends(get_service(PaymentService)),
     world_service: WorldService = Depends(get_service(WorldService))
 ):
@@ -288,11 +289,12 @@ async def create_world_tier_upgrade_checkout(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="Only the world owner can purchase tier upgrades"
             )
-        checkout_url = payment_service.create_world_tier_upgrade_checkout(
+        checkout_url = await payment_service.create_world_tier_upgrade_checkout(
             user_id=current_user.id,
             world_id=world_id,
             success_url=success_url,
-            cancel_url=cancel_url
+            cancel_url=cancel_url,
+            idempotency_key=idempotency_key
         )
         return {"checkout_url": checkout_url}
     except ValueError as e:
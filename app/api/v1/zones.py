@@ -8,7 +8,7 @@ from app.schemas import (
     ZoneList, ZoneResponse, ZoneTreeNode, ZoneUpdate
 )
 from app.api.auth import get_current_user
-from app.api.dependencies import get_service
+from app.api.dependencies import get_service, get_idempotency_key
 from app.services.zone_service import ZoneService
 from app.services.world_service import WorldService
 from app.services.payment_service import PaymentService
@@ -348,6 +348,7 @@ async def create_zone_tier_upgrade_checkout(
     success_url: str = Body(..., embed=True),
     cancel_url: str = Body(..., embed=True),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Depends(get_idempotency_key),
     payment_service: PaymentService = Depends(get_service(PaymentService)),
     zone_service: ZoneService = Depends(get_service(ZoneService)),
     world_service: WorldService = Depends(get_service(WorldService))
@@ -378,11 +379,12 @@ async def create_zone_tier_upgrade_checkout(
                 detail="Only the world owner can purchase zone tier upgrades"
             )
         
-        checkout_url = payment_service.create_zone_tier_upgrade_checkout(
+        checkout_url = await payment_service.create_zone_tier_upgrade_checkout(
             user_id=current_user.id,
             zone_id=zone_id,
             success_url=success_url,
-            cancel_url=cancel_url
+            cancel_url=cancel_url,
+            idempotency_key=idempotency_key
         )
         
         return {"checkout_url": checkout_url}
@@ -1,5 +1,6 @@
 # app/config.py
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 from functools import lru_cache
 from dotenv import load_dotenv
@@ -16,6 +17,9 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str
+    DB_POOL_SIZE: int = 25
+    DB_MAX_OVERFLOW: int = 50
+    DB_POOL_RECYCLE: int = 1800  # seconds
     
     # API configuration
     API_PREFIX: str = "/api/v1"
@@ -28,6 +32,11 @@ class Settings(BaseSettings):
     STRIPE_API_KEY: str
     STRIPE_WEBHOOK_SECRET: str
     STRIPE_PREMIUM_PRICE_ID: str
+    # Optional pre-created Prices for one-time purchases; inline price_data is used when unset
+    STRIPE_PREMIUM_WORLD_PRICE_ID: Optional[str] = None
+    STRIPE_ZONE_UPGRADE_PRICE_ID: Optional[str] = None
+    STRIPE_ENTITY_LIMIT_UPGRADE_PRICE_ID: Optional[str] = None
+    STRIPE_TIER_UPGRADE_PRICE_ID: Optional[str] = None
     
     # Usage limits
     FREE_MESSAGES_PER_DAY: int = 50
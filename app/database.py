@@ -1,5 +1,5 @@
 # app/database.py
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from supabase import create_client, Client
@@ -9,7 +9,19 @@ from app.config import get_settings
 settings = get_settings()
 
 # Create SQLAlchemy engine and session factory
-engine = create_engine(settings.DATABASE_URL)
+# Pooled engine: connections are reused across requests, checked before use and
+# recycled before server-side idle timeouts. LIFO checkout keeps bursts on the
+# most recently used (warm) connections and lets surplus ones idle out. The larger
+# compiled-statement cache lets hot service queries skip recompilation.
+engine = create_engine(
+    settings.DATABASE_URL,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_use_lifo=True,
+    query_cache_size=1200,
+)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create Supabase client
@@ -18,6 +30,26 @@ supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_KEY)
 # SQLAlchemy Base
 Base = declarative_base()
 
+# Additive DDL for columns added to tables that already exist. create_all only
+# creates missing tables, so these run right after it; each one is idempotent.
+SCHEMA_UPDATES = [
+    "ALTER TABLE players ADD COLUMN IF NOT EXISTS stripe_customer_id VARCHAR(100)",
+    "ALTER TABLE zones ADD COLUMN IF NOT EXISTS entity_limit_upgrades INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE worlds ADD COLUMN IF NOT EXISTS zone_limit_upgrades INTEGER NOT NULL DEFAULT 0",
+    "CREATE INDEX IF NOT EXISTS ix_entities_zone_name ON entities (zone_id, name)",
+    "CREATE INDEX IF NOT EXISTS ix_characters_agent_id ON characters (agent_id)",
+    "ALTER TABLE stripe_events ADD COLUMN IF NOT EXISTS last_error TEXT",
+    "ALTER TABLE stripe_events ADD COLUMN IF NOT EXISTS payload TEXT",
+    "ALTER TABLE stripe_events ADD COLUMN IF NOT EXISTS attempts INTEGER NOT NULL DEFAULT 0",
+]
+
+
+def apply_schema_updates():
+    """Bring existing tables up to date with the models (run after create_all)."""
+    with engine.begin() as conn:
+        for statement in SCHEMA_UPDATES:
+            conn.execute(text(statement))
+
 
 # Dependency to get DB session
 def get_db():
@@ -4,7 +4,7 @@ import logging
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 
-from app.database import SessionLocal, engine, Base
+from app.database import SessionLocal, engine, Base, apply_schema_updates
 from app.models.character import Character, CharacterType
 from app.models.subscription import SubscriptionPlan
 from app.models.agent import Agent
@@ -14,6 +14,7 @@ from app.models.player import Player
 from app.models.enums import EntityType
 from app.models.object import Object, ObjectType
 from app.config import get_settings
+from app.services.payment_service import invalidate_plan_cache
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -54,6 +55,8 @@ def seed_subscription_plans(db: Session) -> List[SubscriptionPlan]:
     db.add(free_plan)
     db.add(premium_plan)
     db.commit()
+    # Plans are served from an in-process cache; drop it so the new rows are picked up
+    invalidate_plan_cache()
 
     logger.info("Created subscription plans: Free and Premium")
     return [free_plan, premium_plan]
@@ -372,6 +375,7 @@ def seed_database():
     db = SessionLocal()
     try:
         Base.metadata.create_all(bind=engine)
+        apply_schema_updates()
         
         # Create data in logical order
         seed_subscription_plans(db)
@@ -3,16 +3,18 @@ from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPExcept
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
 from sqlalchemy.orm import Session
+import asyncio
 import logging
 
 from app.api.v1.router import api_router
-from app.database import engine, Base, get_db
+from app.database import engine, Base, get_db, SessionLocal, apply_schema_updates
 from app.config import get_settings
 from app.websockets.connection_manager import handle_game_connection
 # from app.websockets.connection_manager import handle_websocket_connection, 
 # from app.websockets.connection_manager import handle_websocket_connection
 from app.database_seeder import seed_database
 from app.services.auth_service import AuthService
+from app.services.payment_service import warm_plan_cache, run_stripe_event_sweeper
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -22,10 +24,15 @@ logger = logging.getLogger(__name__)
 
 # Create tables in the database
 Base.metadata.create_all(bind=engine)
+apply_schema_updates()
 
 # Seed the database with initial data
 seed_database()
 
+# Load subscription plans into the in-process cache
+with SessionLocal() as db:
+    warm_plan_cache(db)
+
 # Get settings
 settings = get_settings()
 
@@ -49,6 +56,12 @@ app.add_middleware(
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
 
+@app.on_event("startup")
+async def start_stripe_event_sweeper():
+    """Retry Stripe webhook events that were recorded but not applied"""
+    app.state.stripe_event_sweeper = asyncio.create_task(run_stripe_event_sweeper())
+
+
 @app.get("/")
 async def root():
     """Health check and welcome message"""
@@ -13,7 +13,7 @@ class Character(Entity):
     character_type = Column(SAEnum(CharacterType), nullable=False)
     settings = Column(JSON, nullable=True)
     player_id = Column(String(36), ForeignKey("players.id"), nullable=True)
-    agent_id = Column(String(36), ForeignKey("agents.id"), nullable=True)
+    agent_id = Column(String(36), ForeignKey("agents.id"), nullable=True, index=True)
     
     # Relationships
     player = relationship("Player", back_populates="character")
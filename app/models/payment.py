@@ -0,0 +1,48 @@
+# app/models/payment.py
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey
+from app.database import Base
+from app.models.mixins import TimestampMixin
+
+class PendingUpgrade(Base, TimestampMixin):
+    """An upgrade paid for through a Stripe checkout session, recorded when the session is created"""
+    __tablename__ = "pending_upgrades"
+
+    session_id = Column(String(255), primary_key=True)  # Stripe checkout session ID
+    user_id = Column(String(36), ForeignKey("players.id"), nullable=False)
+    resource_type = Column(String(20), nullable=False)
+    resource_id = Column(String(36), nullable=False)
+
+    # Set once the upgrade has been applied; guards against duplicate webhook deliveries
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<PendingUpgrade {self.session_id} - {self.resource_type} {self.resource_id}>"
+
+
+class FulfilledCheckout(Base, TimestampMixin):
+    """A one-time checkout session whose purchase has been applied; the primary key makes fulfilment idempotent"""
+    __tablename__ = "fulfilled_checkouts"
+
+    session_id = Column(String(255), primary_key=True)  # Stripe checkout session ID
+
+    def __repr__(self):
+        return f"<FulfilledCheckout {self.session_id}>"
+
+
+class StripeEvent(Base, TimestampMixin):
+    """
+    A verified Stripe webhook event, recorded before it is processed.
+    processed_at is set once it was handled, with last_error if that failed for good;
+    open events are retried by the sweeper.
+    """
+    __tablename__ = "stripe_events"
+
+    event_id = Column(String(255), primary_key=True)  # Stripe event ID (evt_...)
+    event_type = Column(String(100), nullable=False)
+    payload = Column(Text, nullable=True)  # raw event JSON as received
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)  # transient failures so far
+    processed_at = Column(DateTime(timezone=True), nullable=True)
+    last_error = Column(Text, nullable=True)
+
+    def __repr__(self):
+        return f"<StripeEvent {self.event_id} - {self.event_type}>"
@@ -14,6 +14,7 @@ class Player(Base, TimestampMixin):
     is_active = Column(Boolean, default=True)
     is_premium = Column(Boolean, default=False, nullable=False)
     premium_since = Column(DateTime, nullable=True)
+    stripe_customer_id = Column(String(100), nullable=True)
     is_admin = Column(Boolean, default=False, nullable=False)
     
     # Relationships
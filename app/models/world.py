@@ -12,6 +12,7 @@ class World(Base, TimestampMixin):
     description = Column(Text, nullable=True)
     properties = Column(JSON, nullable=True)
     tier = Column(Integer, default=1)
+    zone_limit_upgrades = Column(Integer, default=0, server_default="0", nullable=False)
     is_official = Column(Boolean, default=False, nullable=False)
     is_private = Column(Boolean, default=False, nullable=False)
     
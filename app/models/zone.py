@@ -12,6 +12,7 @@ class Zone(Base, TimestampMixin):
     description = Column(Text, nullable=True)
     properties = Column(JSON, nullable=True)
     tier = Column(Integer, default=1)
+    entity_limit_upgrades = Column(Integer, default=0, server_default="0", nullable=False)
     
     world_id = Column(String(36), ForeignKey("worlds.id"), nullable=False, index=True)
     parent_zone_id = Column(String(36), ForeignKey("zones.id"), nullable=True, index=True)
@@ -42,3 +42,7 @@ class ObjectResponse(ObjectBase):
 class ObjectList(PaginatedResponse):
     """Paginated list of objects"""
     items: List[ObjectResponse]
+    # total/total_pages are null and has_next is set when the caller passes skip_count
+    total: Optional[int] = None
+    total_pages: Optional[int] = None
+    has_next: Optional[bool] = None
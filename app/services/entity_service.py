@@ -5,6 +5,8 @@ from typing import List, Optional, Dict, Any, Tuple
 import math
 
 from app.models.entity import Entity
+from app.models.world import World
+from app.models.zone import Zone
 from app.models.enums import EntityType
 
 class EntityService:
@@ -17,6 +19,24 @@ class EntityService:
         """Get any entity by ID."""
         return self.db.query(Entity).filter(Entity.id == entity_id).first()
     
+    def get_entity_with_owner(self, entity_id: str) -> Tuple[Optional[Entity], Optional[str]]:
+        """
+        Get an entity together with the owner ID of its world, in a single query.
+        
+        Returns:
+            Tuple of (entity, world_owner_id); (None, None) if the entity doesn't exist.
+        """
+        row = (
+            self.db.query(Entity, World.owner_id)
+            .join(Zone, Zone.id == Entity.zone_id)
+            .join(World, World.id == Zone.world_id)
+            .filter(Entity.id == entity_id)
+            .first()
+        )
+        if not row:
+            return None, None
+        return row[0], row[1]
+    
     def get_entities(
         self, 
         filters: Dict[str, Any] = None, 
@@ -39,7 +59,6 @@ class EntityService:
             
             if 'world_id' in filters:
                 # Since Entity no longer has world_id, join via the Zone relationship.
-                from app.models.zone import Zone
                 query = query.join(Entity.zone).filter(Zone.world_id == filters['world_id'])
             
             if 'name' in filters:
@@ -180,7 +199,6 @@ class EntityService:
         Move an entity to a different zone.
         """
         entity = self.get_entity(entity_id)
-        from app.models.zone import Zone
         zone = self.db.query(Zone).filter(Zone.id == zone_id).first()
         
         if not entity or not zone:
@@ -1,9 +1,9 @@
 # app/services/object_service.py
 from sqlalchemy.orm import Session
-from typing import List, Optional, Dict, Any, Tuple
-from sqlalchemy import or_
-import math
+from typing import List, Optional, Dict, Any, Tuple, Union
+from sqlalchemy import or_, bindparam, String
 
+from app.models.entity import Entity
 from app.models.object import Object, ObjectType
 from app.models.zone import Zone
 
@@ -54,7 +54,8 @@ class ObjectService:
                     page: int = 1, 
                     page_size: int = 20, 
                     sort_by: str = "name", 
-                    sort_desc: bool = False) -> Tuple[List[Object], int, int]:
+                    sort_desc: bool = False,
+                    exact_count: bool = True) -> Tuple[List[Object], Optional[int], Union[int, bool]]:
         """
         Retrieve objects with optional filters, sorting, and pagination.
         
@@ -64,9 +65,12 @@ class ObjectService:
             page_size: Number of records per page.
             sort_by: Field name to sort by.
             sort_desc: Sort descending if True.
+            exact_count: If True (default), run a COUNT(*) for the total. Otherwise
+                fetch one extra row to detect whether a next page exists.
             
         Returns:
-            A tuple of (list of objects, total record count, total pages).
+            A tuple of (list of objects, total record count, total pages) when
+            exact_count is True, or (list of objects, None, has_next) otherwise.
         """
         query = self.db.query(Object)
         
@@ -81,7 +85,8 @@ class ObjectService:
             if 'description' in filters:
                 query = query.filter(Object.description.ilike(f"%{filters['description']}%"))
             if 'search' in filters and filters['search']:
-                search_term = f"%{filters['search']}%"
+                # One bind parameter shared by both ILIKE clauses
+                search_term = bindparam("search", f"%{filters['search']}%", type_=String)
                 query = query.filter(
                     or_(
                         Object.name.ilike(search_term),
@@ -89,9 +94,6 @@ class ObjectService:
                     )
                 )
         
-        total_count = query.count()
-        total_pages = math.ceil(total_count / page_size) if total_count > 0 else 1
-        
         if hasattr(Object, sort_by):
             sort_field = getattr(Object, sort_by)
             query = query.order_by(sort_field.desc() if sort_desc else sort_field)
@@ -99,6 +101,15 @@ class ObjectService:
             query = query.order_by(Object.name.desc() if sort_desc else Object.name)
         
         offset = (page - 1) * page_size if page > 0 else 0
+        
+        if not exact_count:
+            # Fetch one extra row to find out whether another page follows
+            objects = query.offset(offset).limit(page_size + 1).all()
+            has_next = len(objects) > page_size
+            return objects[:page_size], None, has_next
+        
+        total_count = query.order_by(None).count()
+        total_pages = max(1, (total_count + page_size - 1) // page_size)
         objects = query.offset(offset).limit(page_size).all()
         
         return objects, total_count, total_pages
@@ -149,7 +160,8 @@ class ObjectService:
                        zone_id: Optional[str] = None,
                        world_id: Optional[str] = None,
                        page: int = 1, 
-                       page_size: int = 20) -> Tuple[List[Object], int, int]:
+                       page_size: int = 20,
+                       exact_count: bool = True) -> Tuple[List[Object], Optional[int], Union[int, bool]]:
         """
         Search for objects by name or description.
         
@@ -159,9 +171,10 @@ class ObjectService:
             world_id: Optional world ID to narrow the search.
             page: Page number.
             page_size: Number of results per page.
+            exact_count: Whether to compute the exact total (see get_objects).
             
         Returns:
-            A tuple of (list of objects, total record count, total pages).
+            Same tuple shape as get_objects.
         """
         filters = {'search': query_str}
         if zone_id:
@@ -169,7 +182,12 @@ class ObjectService:
         if world_id:
             filters['world_id'] = world_id
         
-        return self.get_objects(filters=filters, page=page, page_size=page_size)
+        return self.get_objects(
+            filters=filters,
+            page=page,
+            page_size=page_size,
+            exact_count=exact_count
+        )
     
     def move_object_to_zone(self, object_id: str, zone_id: str) -> bool:
         """
@@ -182,13 +200,13 @@ class ObjectService:
         Returns:
             True if the move was successful, False otherwise.
         """
-        obj = self.get_object(object_id)
-        if not obj:
-            return False
-        
-        obj.zone_id = zone_id
+        # zone_id lives on the base entities table; update it in place
+        updated = self.db.query(Entity).filter(
+            Entity.id == object_id,
+            Entity.type == "object"
+        ).update({Entity.zone_id: zone_id})
         self.db.commit()
-        return True
+        return updated > 0
         
     def upgrade_object_tier(self, object_id: str) -> bool:
         """
@@ -200,10 +218,9 @@ class ObjectService:
         Returns:
             True if successful, False otherwise.
         """
-        obj = self.get_object(object_id)
-        if not obj:
-            return False
-        
-        obj.tier += 1
+        updated = self.db.query(Entity).filter(
+            Entity.id == object_id,
+            Entity.type == "object"
+        ).update({Entity.tier: Entity.tier + 1})
         self.db.commit()
-        return True
+        return updated > 0
@@ -1,15 +1,34 @@
 # app/services/payment_service.py
+import asyncio
 import stripe
+import hashlib
+import json
 import logging
-from datetime import datetime
-from typing import Optional, Dict, Any, List
-from sqlalchemy.orm import Session
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple, Union
+from sqlalchemy import exists, func, lambda_stmt, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError, InterfaceError, OperationalError
+from sqlalchemy.orm import Session, joinedload
 
 from app.config import get_settings
+from app.database import SessionLocal
 from app.models.player import Player
+from app.models.entity import Entity
+from app.models.payment import PendingUpgrade, FulfilledCheckout, StripeEvent
+from app.models.world import World
+from app.models.zone import Zone
 from app.models.subscription import SubscriptionPlan, UserSubscription, SubscriptionStatus
-from app.models.enums import SubscriptionStatus  # if needed
+from app.models.enums import SubscriptionStatus, EntityType
 from app.services.player_service import PlayerService
+from app.services.world_service import WorldService
+from app.services.entity_service import EntityService
+from app.services.character_service import CharacterService
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -17,91 +36,528 @@ settings = get_settings()
 # Configure Stripe API
 stripe.api_key = settings.STRIPE_API_KEY
 
+# Async client for request-path calls, so Stripe round trips don't block the event loop.
+# Connection errors are retried by the SDK; create calls carry idempotency keys, so retries are safe.
+stripe_client = stripe.StripeClient(
+    settings.STRIPE_API_KEY,
+    http_client=stripe.HTTPXClient(),
+    max_network_retries=2
+)
+
+_UTC = timezone.utc
+
+# Stripe statuses that keep a subscription (and premium access) active
+_ACTIVE_STATUSES = frozenset({SubscriptionStatus.ACTIVE, SubscriptionStatus.TRIALING})
+
+# Tables holding the tier for each upgradable resource type; the rest are entities
+_TIER_UPGRADE_MODELS = {"world": World, "zone": Zone}
+
+# Standard prices for one-time purchases (USD)
+PREMIUM_WORLD_PRICE = 249.99
+ZONE_UPGRADE_PRICE = 49.99
+ENTITY_LIMIT_UPGRADE_PRICE = 9.99
+TIER_UPGRADE_PRICE = 4.99
+
+# Plans only change on deploy/seed, so lookups are served from memory
+PLAN_CACHE_TTL_SECONDS = 3600
+
+# Fulfilled checkout sessions are remembered for Stripe's retry window
+STRIPE_SESSION_CACHE_TTL_SECONDS = 86400
+
+# Recorded webhook events still open after this long are retried by the sweeper,
+# until they have failed transiently STRIPE_EVENT_MAX_ATTEMPTS times
+STRIPE_EVENT_SWEEP_INTERVAL_SECONDS = 60
+STRIPE_EVENT_MAX_ATTEMPTS = 10
+
+
+@dataclass(frozen=True)
+class CheckoutSpec:
+    """What a checkout session sells: mode, line items and product metadata"""
+    mode: str
+    line_items: List[Dict[str, Any]]
+    metadata: Dict[str, str]
+
+
+@dataclass(frozen=True)
+class CachedPlan:
+    """Read-only snapshot of a SubscriptionPlan row, safe to share across sessions"""
+    id: str
+    name: str
+    description: Optional[str]
+    stripe_price_id: str
+    price_amount: int
+    price_currency: str
+    interval: str
+    messages_per_day: int
+    max_conversations: int
+    max_characters: int
+    can_make_public_characters: bool
+
+    @classmethod
+    def from_model(cls, plan: SubscriptionPlan) -> "CachedPlan":
+        return cls(
+            id=plan.id,
+            name=plan.name,
+            description=plan.description,
+            stripe_price_id=plan.stripe_price_id,
+            price_amount=plan.price_amount,
+            price_currency=plan.price_currency,
+            interval=plan.interval,
+            messages_per_day=plan.messages_per_day,
+            max_conversations=plan.max_conversations,
+            max_characters=plan.max_characters,
+            can_make_public_characters=plan.can_make_public_characters,
+        )
+
+
+class _PlanCache:
+    """Process-local TTL cache of subscription plans keyed by id and Stripe price ID"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._by_id: Dict[str, CachedPlan] = {}
+        self._by_stripe_price_id: Dict[str, CachedPlan] = {}
+        self._loaded_at: Optional[float] = None
+
+    def _is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    def load(self, db: Session) -> None:
+        """Load every plan with a single query and swap in fresh lookup tables."""
+        plans = [CachedPlan.from_model(plan) for plan in db.query(SubscriptionPlan).all()]
+        self._by_id = {plan.id: plan for plan in plans}
+        self._by_stripe_price_id = {plan.stripe_price_id: plan for plan in plans}
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self, db: Session) -> None:
+        if not self._is_fresh():
+            self.load(db)
+
+    def _add(self, plan: CachedPlan) -> None:
+        self._by_id[plan.id] = plan
+        self._by_stripe_price_id[plan.stripe_price_id] = plan
+
+    def all(self, db: Session) -> List[CachedPlan]:
+        self._ensure_loaded(db)
+        return list(self._by_id.values())
+
+    def get(self, db: Session, plan_id: str) -> Optional[CachedPlan]:
+        self._ensure_loaded(db)
+        plan = self._by_id.get(plan_id)
+        if plan is None:
+            # Plan created since the last load; fall through to the database
+            row = db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
+            if row:
+                plan = CachedPlan.from_model(row)
+                self._add(plan)
+        return plan
+
+    def get_by_stripe_price_id(self, db: Session, stripe_price_id: str) -> Optional[CachedPlan]:
+        self._ensure_loaded(db)
+        plan = self._by_stripe_price_id.get(stripe_price_id)
+        if plan is None:
+            row = db.query(SubscriptionPlan).filter(
+                SubscriptionPlan.stripe_price_id == stripe_price_id
+            ).first()
+            if row:
+                plan = CachedPlan.from_model(row)
+                self._add(plan)
+        return plan
+
+    def invalidate(self) -> None:
+        self._by_id = {}
+        self._by_stripe_price_id = {}
+        self._loaded_at = None
+
+
+_plan_cache = _PlanCache(PLAN_CACHE_TTL_SECONDS)
+
+
+class _TTLCache:
+    """Small bounded cache with a per-entry expiry, used to remember fulfilled checkout sessions"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: Dict[str, Any] = {}
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.monotonic() >= expires_at:
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key: str, value: Any, ttl: float) -> None:
+        if key not in self._entries and len(self._entries) >= self.maxsize:
+            # Evict the oldest insertion to stay bounded
+            self._entries.pop(next(iter(self._entries)), None)
+        self._entries[key] = (time.monotonic() + ttl, value)
+
+
+_stripe_cache = _TTLCache(maxsize=1024)
+
+
+class _SubscriptionEventLog:
+    """
+    Bounded LRU of the newest subscription event handled per Stripe subscription.
+    Lets retried or out-of-order deliveries be dropped before any Stripe call.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._latest: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+
+    def is_stale(self, subscription_id: str, created: int, event_id: str) -> bool:
+        latest = self._latest.get(subscription_id)
+        if latest is None:
+            return False
+        latest_created, latest_event_id = latest
+        return event_id == latest_event_id or created < latest_created
+
+    def record(self, subscription_id: str, created: int, event_id: str) -> None:
+        latest = self._latest.get(subscription_id)
+        if latest is not None and created < latest[0]:
+            return
+        self._latest[subscription_id] = (created, event_id)
+        self._latest.move_to_end(subscription_id)
+        if len(self._latest) > self.maxsize:
+            self._latest.popitem(last=False)
+
+
+_subscription_events = _SubscriptionEventLog(maxsize=10000)
+
+# Webhook event types process_stripe_event dispatches; others are acknowledged and ignored
+_HANDLED_EVENT_TYPES = frozenset({
+    "checkout.session.completed",
+    "customer.subscription.updated",
+    "customer.subscription.deleted",
+})
+
+# Failures a later attempt may get past: lost database connections and Stripe
+# being unreachable, rate limiting or erroring on its side
+_TRANSIENT_ERRORS = (
+    OperationalError,
+    InterfaceError,
+    stripe.error.APIConnectionError,
+    stripe.error.RateLimitError,
+    stripe.error.APIError,
+)
+
+
+class RetryableStripeEventError(Exception):
+    """A webhook handler failed for a transient reason; the event should be processed again"""
+
+
+def _raise_if_transient(e: Exception) -> None:
+    """Re-raise a transient handler failure as RetryableStripeEventError; other errors are left to the caller."""
+    if isinstance(e, _TRANSIENT_ERRORS):
+        raise RetryableStripeEventError(str(e)) from e
+
+
+def _one_time_line_item(
+    catalog_price_id: Optional[str],
+    price: float,
+    standard_price: float,
+    name: str,
+    description: str
+) -> Dict[str, Any]:
+    """
+    Build a checkout line item for a one-time purchase without a Price.create call.
+    The pre-created catalog Price is used when configured and the standard amount
+    is charged; otherwise the price is sent inline as price_data.
+    """
+    if catalog_price_id and price == standard_price:
+        return {"price": catalog_price_id, "quantity": 1}
+    return {
+        "price_data": {
+            "currency": "usd",
+            "unit_amount": int(price * 100),  # convert to cents
+            "product_data": {"name": name, "description": description},
+        },
+        "quantity": 1,
+    }
+
+
+def _as_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Treat naive datetimes read back from the database as UTC so they compare with aware ones."""
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=_UTC)
+    return value
+
+
+def _from_stripe_timestamp(value: Optional[int]) -> Optional[datetime]:
+    """Convert a Stripe epoch timestamp to an aware UTC datetime; the fixed UTC zone skips any localtime lookup."""
+    return datetime.fromtimestamp(value, _UTC) if value else None
+
+
+def _checkout_idempotency_key(params: Dict[str, Any], attempt_key: Optional[str] = None) -> str:
+    """
+    Build the Stripe idempotency key for a checkout from the purchase attempt and its parameters.
+    A retry of the same attempt gets the same session back; without an attempt key every
+    call is a new attempt, so a repeat purchase never reuses an already completed session.
+    The parameter hash keeps attempt keys from different customers or carts apart.
+    """
+    attempt = hashlib.sha256(attempt_key.encode()).hexdigest()[:32] if attempt_key else uuid.uuid4().hex
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f"checkout-{attempt}-{digest[:32]}"
+
+
+def warm_plan_cache(db: Session) -> None:
+    """Populate the subscription plan cache (called once at startup)."""
+    _plan_cache.load(db)
+
+
+def invalidate_plan_cache() -> None:
+    """
+    Drop cached plans; call after any change to subscription_plans (the seeder does).
+    Only this process is affected; other workers pick up changes within PLAN_CACHE_TTL_SECONDS.
+    """
+    _plan_cache.invalidate()
+
 
 class PaymentService:
     """Service for handling Stripe payments and subscriptions"""
 
     def __init__(self, db: Session):
         self.db = db
-        self.player_service = PlayerService(db)
+        # Services are built per request, so this memo lives only as long as the request
+        self._premium_by_user: Dict[str, bool] = {}
+        self._customer_ids: Dict[str, str] = {}
+
+    # Collaborating services are built on first use and then shared by every call on this instance
+
+    @cached_property
+    def player_service(self) -> PlayerService:
+        return PlayerService(self.db)
+
+    @cached_property
+    def world_service(self) -> WorldService:
+        return WorldService(self.db)
+
+    @cached_property
+    def entity_service(self) -> EntityService:
+        return EntityService(self.db)
+
+    @cached_property
+    def character_service(self) -> CharacterService:
+        return CharacterService(self.db)
 
     # --- Subscription and Plan Retrieval Methods ---
 
-    def get_subscription_plans(self) -> List[SubscriptionPlan]:
-        """Get all available subscription plans"""
-        return self.db.query(SubscriptionPlan).all()
+    def get_subscription_plans(self) -> List[CachedPlan]:
+        """Get all available subscription plans (served from the plan cache)"""
+        return _plan_cache.all(self.db)
 
-    def get_plan_by_id(self, plan_id: str) -> Optional[SubscriptionPlan]:
-        """Get a subscription plan by ID"""
-        return self.db.query(SubscriptionPlan).filter(SubscriptionPlan.id == plan_id).first()
+    def get_plan_by_id(self, plan_id: str) -> Optional[CachedPlan]:
+        """Get a subscription plan by ID (served from the plan cache)"""
+        return _plan_cache.get(self.db, plan_id)
 
-    def get_plan_by_stripe_id(self, stripe_price_id: str) -> Optional[SubscriptionPlan]:
-        """Get a subscription plan by Stripe price ID"""
-        return self.db.query(SubscriptionPlan).filter(
-            SubscriptionPlan.stripe_price_id == stripe_price_id
-        ).first()
+    def get_plan_by_stripe_id(self, stripe_price_id: str) -> Optional[CachedPlan]:
+        """Get a subscription plan by Stripe price ID (served from the plan cache)"""
+        return _plan_cache.get_by_stripe_price_id(self.db, stripe_price_id)
 
-    def get_user_subscription(self, user_id: str) -> Optional[UserSubscription]:
-        """Get a user's current subscription"""
-        return self.db.query(UserSubscription).filter(
+    def get_user_subscription(self, user_id: str, with_plan: bool = False) -> Optional[UserSubscription]:
+        """Get a user's current subscription, joining in its plan when the caller will read it"""
+        # lambda_stmt caches the constructed statement too; user_id is extracted as a bound parameter
+        stmt = lambda_stmt(lambda: select(UserSubscription).where(
             UserSubscription.user_id == user_id,
-            UserSubscription.is_active == True
-        ).first()
+            UserSubscription.is_active.is_(True)
+        ).limit(1))
+        if with_plan:
+            stmt += lambda s: s.options(joinedload(UserSubscription.plan))
+        return self.db.execute(stmt).scalars().first()
 
     def get_subscription_by_stripe_id(self, stripe_subscription_id: str) -> Optional[UserSubscription]:
         """Get a subscription by Stripe subscription ID"""
-        return self.db.query(UserSubscription).filter(
-            UserSubscription.stripe_subscription_id == stripe_subscription_id
-        ).first()
+        return self.db.execute(
+            lambda_stmt(lambda: select(UserSubscription).where(
+                UserSubscription.stripe_subscription_id == stripe_subscription_id
+            ).limit(1))
+        ).scalars().first()
 
     # --- Customer and Checkout Helpers ---
 
-    def _get_or_create_customer(self, user: Player) -> str:
+    def _set_premium(self, user_id: str, is_premium) -> None:
+        """
+        Set a player's premium flag with a single UPDATE, without loading the row.
+        is_premium may be a bool or a SQL boolean expression evaluated by the UPDATE.
+        The session is not synchronized, so a Player already loaded in this session
+        keeps its old is_premium until it is refreshed or the transaction ends.
+        """
+        self.db.execute(
+            update(Player)
+            .where(Player.id == user_id)
+            .values(is_premium=is_premium)
+            .execution_options(synchronize_session=False)
+        )
+        self._premium_by_user.pop(user_id, None)
+
+    def _release_connection(self) -> None:
+        """
+        End the current read-only transaction so the pooled connection goes back to
+        the pool while we wait on Stripe. Loaded objects reload on next access.
+        """
+        self.db.commit()
+
+    def _get_processed_checkout(self, session_id: str) -> Optional[Any]:
+        """Return the recorded result if this checkout session was already fulfilled."""
+        return _stripe_cache.get(f"processed:{session_id}")
+
+    def _mark_checkout_processed(self, session_id: str, result: Any) -> None:
+        """Record a fulfilled checkout so duplicate deliveries short-circuit."""
+        _stripe_cache.set(f"processed:{session_id}", result, STRIPE_SESSION_CACHE_TTL_SECONDS)
+
+    def _claim_checkout(self, session_id: str) -> bool:
+        """
+        Record a checkout session as fulfilled within the current transaction.
+        Returns False (after rolling back) if another delivery already claimed it.
+        """
+        try:
+            self.db.add(FulfilledCheckout(session_id=session_id))
+            self.db.flush()
+            return True
+        except IntegrityError:
+            self.db.rollback()
+            return False
+
+    async def _create_checkout(
+        self, user: Player, success_url: str, cancel_url: str, spec: CheckoutSpec,
+        idempotency_key: Optional[str] = None
+    ) -> str:
+        """
+        Create a Stripe checkout session for the user and return its URL.
+        """
+        checkout_session = await self._create_checkout_session(
+            user, success_url, cancel_url, spec, idempotency_key=idempotency_key
+        )
+        return checkout_session.url
+
+    async def _create_checkout_session(
+        self, user: Player, success_url: str, cancel_url: str, spec: CheckoutSpec,
+        idempotency_key: Optional[str] = None
+    ):
+        """
+        Create a Stripe checkout session for the user.
+        idempotency_key identifies one purchase attempt (e.g. the client's Idempotency-Key
+        header); retries of that attempt get the same session, new attempts a new one.
+        Stripe errors are raised as ValueError.
+        """
+        try:
+            user_id = user.id
+            stripe_customer_id = await self._get_or_create_customer(user)
+
+            params = {
+                "customer": stripe_customer_id,
+                "payment_method_types": ["card"],
+                "line_items": spec.line_items,
+                "mode": spec.mode,
+                "success_url": f"{success_url}?session_id={{CHECKOUT_SESSION_ID}}",
+                "cancel_url": cancel_url,
+                "metadata": {"user_id": user_id, **spec.metadata},
+            }
+            self._release_connection()
+            return await stripe_client.checkout.sessions.create_async(
+                params=params,
+                options={"idempotency_key": _checkout_idempotency_key(params, idempotency_key)}
+            )
+
+        except stripe.error.StripeError as e:
+            logger.error("Stripe error: %s", e)
+            raise ValueError(f"Payment processing error: {str(e)}")
+
+    async def _get_or_create_customer(self, user: Player) -> str:
         """
         Get or create a Stripe customer for a user.
+        The customer ID is stored on the player so later checkouts skip both
+        the subscription lookup and the Stripe call; within one service instance
+        it is also memoized, since the commit here expires the loaded player.
         """
-        stripe_customer_id = None
-        existing_subscription = self.get_user_subscription(user.id)
-        if existing_subscription and existing_subscription.stripe_customer_id:
-            stripe_customer_id = existing_subscription.stripe_customer_id
+        user_id = user.id
+        cached = self._customer_ids.get(user_id)
+        if cached:
+            return cached
+        if user.stripe_customer_id:
+            self._customer_ids[user_id] = user.stripe_customer_id
+            return user.stripe_customer_id
+
+        email, display_name = user.email, user.display_name
+
+        # Players from before the column existed may have one on a subscription;
+        # read just that column rather than hydrating the subscription row
+        stripe_customer_id = self.db.execute(
+            select(UserSubscription.stripe_customer_id).where(
+                UserSubscription.user_id == user_id,
+                UserSubscription.is_active.is_(True),
+                UserSubscription.stripe_customer_id.is_not(None)
+            ).limit(1)
+        ).scalar()
 
         if not stripe_customer_id:
-            customer = stripe.Customer.create(
-                email=user.email,
-                name=user.display_name,
-                metadata={"user_id": user.id}
+            self._release_connection()
+            # Keyed on the player so concurrent first checkouts share one customer
+            customer = await stripe_client.customers.create_async(
+                params={
+                    "email": email,
+                    "name": display_name,
+                    "metadata": {"user_id": user_id}
+                },
+                options={"idempotency_key": f"customer-{user_id}"}
             )
             stripe_customer_id = customer.id
 
+        self.db.execute(
+            update(Player)
+            .where(Player.id == user_id)
+            .values(stripe_customer_id=stripe_customer_id)
+            .execution_options(synchronize_session=False)
+        )
+        self.db.commit()
+        self._customer_ids[user_id] = stripe_customer_id
         return stripe_customer_id
 
-    def _verify_entity_ownership(self, entity, user_id: str) -> None:
-        """
-        Verify that a user owns the resource associated with an entity.
-        Raises ValueError if not authorized.
-        
-        Assumes that either entity.world_id or entity.zone_id is set.
-        """
-        from app.services.world_service import WorldService
-        world_service = WorldService(self.db)
-
-        if entity.world_id:
-            world = world_service.get_world(entity.world_id)
-            if not world or world.owner_id != user_id:
-                raise ValueError("Only the world owner can purchase upgrades for this entity.")
-        elif entity.zone_id:
-            from app.services.zone_service import ZoneService
-            zone_service = ZoneService(self.db)
-            zone = zone_service.get_zone(entity.zone_id)
-            if not zone:
-                raise ValueError("Zone not found.")
-            world = world_service.get_world(zone.world_id)
-            if not world or world.owner_id != user_id:
-                raise ValueError("Only the world owner can purchase upgrades for this entity.")
-        else:
-            raise ValueError("Entity does not belong to any world or zone.")
-
-    def create_tier_upgrade_checkout_base(
+    def _load_upgrade_context(
+        self, user_id: str, world_id: Optional[str] = None, zone_id: Optional[str] = None
+    ) -> Tuple[Player, Optional[Zone], World]:
+        """
+        Load the buying player, the zone (if given) and the owning world in one query.
+        Raises ValueError if any of them is missing or the player does not own the world.
+        """
+        world_join = World.id == Zone.world_id if zone_id else World.id == world_id
+        stmt = (
+            select(Player, Zone, World)
+            .select_from(Player)
+            .outerjoin(Zone, Zone.id == zone_id)
+            .outerjoin(World, world_join)
+            .where(Player.id == user_id)
+        )
+        row = self.db.execute(stmt).first()
+        if not row:
+            raise ValueError("User not found")
+        user, zone, world = row
+        if zone_id and not zone:
+            raise ValueError("Zone not found")
+        if not world:
+            raise ValueError("World not found")
+        if world.owner_id != user_id:
+            raise ValueError("Only the world owner can purchase upgrades for this world")
+        return user, zone, world
+
+    def _get_owned_entity(self, entity_id: str, user_id: str):
+        """
+        Load an entity and verify that the user owns the world it belongs to.
+        Raises ValueError if it doesn't exist or the user is not the owner.
+        """
+        entity, owner_id = self.entity_service.get_entity_with_owner(entity_id)
+        if not entity:
+            raise ValueError("Entity not found")
+        if owner_id != user_id:
+            raise ValueError("Only the world owner can purchase upgrades for this entity.")
+        return entity
+
+    async def create_tier_upgrade_checkout_base(
         self,
         user_id: str,
         resource_id: str,
@@ -109,7 +565,8 @@ class PaymentService:
         resource_name: str,
         success_url: str,
         cancel_url: str,
-        price: float
+        price: float,
+        idempotency_key: Optional[str] = None
     ) -> str:
         """
         Base function for creating tier upgrade checkout sessions.
@@ -119,36 +576,39 @@ class PaymentService:
         if not user:
             raise ValueError("User not found")
 
-        stripe_customer_id = self._get_or_create_customer(user)
-
-        price_obj = stripe.Price.create(
-            unit_amount=int(price * 100),  # convert to cents
-            currency="usd",
-            product_data={
-                "name": f"{resource_type.capitalize()} Tier Upgrade: {resource_name}",
-                "description": f"Upgrade {resource_type} tier to unlock additional capabilities"
-            }
+        # Catalog price at the standard amount, otherwise inline; no Price object is created per checkout
+        line_item = _one_time_line_item(
+            settings.STRIPE_TIER_UPGRADE_PRICE_ID,
+            price,
+            TIER_UPGRADE_PRICE,
+            name=f"{resource_type.capitalize()} Tier Upgrade: {resource_name}",
+            description=f"Upgrade {resource_type} tier to unlock additional capabilities"
         )
-
-        checkout_session = stripe.checkout.Session.create(
-            customer=stripe_customer_id,
-            payment_method_types=["card"],
-            line_items=[{"price": price_obj.id, "quantity": 1}],
+        checkout_session = await self._create_checkout_session(user, success_url, cancel_url, CheckoutSpec(
             mode="payment",
-            success_url=f"{success_url}?session_id={{CHECKOUT_SESSION_ID}}",
-            cancel_url=cancel_url,
+            line_items=[line_item],
             metadata={
-                "user_id": user_id,
                 "product_type": f"{resource_type}_tier_upgrade",
                 f"{resource_type}_id": resource_id
             }
-        )
+        ), idempotency_key=idempotency_key)
+
+        # Record what was bought so fulfilment reads it locally rather than from metadata.
+        # merge() keeps an idempotent retry (same session ID) from failing on the primary key.
+        self.db.merge(PendingUpgrade(
+            session_id=checkout_session.id,
+            user_id=user_id,
+            resource_type=resource_type,
+            resource_id=resource_id
+        ))
+        self.db.commit()
         return checkout_session.url
 
     # --- Subscription Checkout Methods ---
 
-    def create_subscription_checkout(
-        self, user_id: str, plan_id: str, success_url: str, cancel_url: str
+    async def create_subscription_checkout(
+        self, user_id: str, plan_id: str, success_url: str, cancel_url: str,
+        idempotency_key: Optional[str] = None
     ) -> str:
         """
         Create a Stripe checkout session for a subscription purchase.
@@ -160,108 +620,154 @@ class PaymentService:
         if not plan:
             raise ValueError("Subscription plan not found")
 
-        try:
-            stripe_customer_id = self._get_or_create_customer(user)
-
-            checkout_session = stripe.checkout.Session.create(
-                customer=stripe_customer_id,
-                payment_method_types=["card"],
-                line_items=[{"price": plan.stripe_price_id, "quantity": 1}],
-                mode="subscription",
-                success_url=f"{success_url}?session_id={{CHECKOUT_SESSION_ID}}",
-                cancel_url=cancel_url,
-                metadata={"user_id": user.id, "plan_id": plan.id},
-            )
-            return checkout_session.url
+        return await self._create_checkout(user, success_url, cancel_url, CheckoutSpec(
+            mode="subscription",
+            line_items=[{"price": plan.stripe_price_id, "quantity": 1}],
+            metadata={"plan_id": plan.id}
+        ), idempotency_key=idempotency_key)
 
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
-            raise ValueError(f"Payment processing error: {str(e)}")
+    async def handle_checkout_completed(self, session) -> Any:
+        """
+        Dispatch a completed checkout session to its fulfilment handler by product_type metadata.
+        Sessions without a product_type are subscription checkouts; an unknown product_type
+        returns None.
+        """
+        product_type = session.metadata.get("product_type")
+        handler = {
+            "premium_world": self.handle_premium_world_checkout_completed,
+            "zone_upgrade": self.handle_zone_upgrade_checkout_completed,
+            "entity_limit_upgrade": self.handle_entity_limit_upgrade_checkout_completed,
+        }.get(product_type)
+        if handler is None:
+            if not product_type:
+                handler = self.handle_subscription_checkout_completed
+            elif product_type.endswith("_tier_upgrade"):
+                handler = self.handle_tier_upgrade_checkout_completed
+            else:
+                logger.error("Unknown product_type %s in checkout session %s", product_type, session.id)
+                return None
+        return await handler(session)
 
-    def handle_subscription_checkout_completed(self, session_id: str) -> Optional[UserSubscription]:
+    async def handle_subscription_checkout_completed(self, session) -> Optional[UserSubscription]:
         """
         Handle a completed checkout session to create a new subscription.
+        The session is the object from the verified webhook event, so it is not re-fetched;
+        the subscription is only retrieved when the session was not expanded with it.
         """
+        # An expanded session carries the full subscription object; otherwise it is just the ID
+        subscription = session.subscription if not isinstance(session.subscription, str) else None
+        subscription_id = subscription.id if subscription is not None else session.subscription
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
-            subscription = stripe.Subscription.retrieve(session.subscription)
+            # Duplicate delivery (webhook retry or success-page redirect): keep the first row
+            existing = self.get_subscription_by_stripe_id(subscription_id)
+            if existing:
+                return existing
+
+            if subscription is None:
+                self._release_connection()
+                subscription = await stripe_client.subscriptions.retrieve_async(subscription_id)
 
             user_id = session.metadata.get("user_id")
             plan_id = session.metadata.get("plan_id")
-            user = self.player_service.get_player(user_id)
             plan = self.get_plan_by_id(plan_id)
-            if not user or not plan:
-                logger.error(f"User or plan not found: user_id={user_id}, plan_id={plan_id}")
+            if not plan:
+                logger.error("Plan not found: plan_id=%s", plan_id)
                 return None
 
-            # Deactivate any existing subscriptions for this user
-            existing_subscriptions = self.db.query(UserSubscription).filter(
-                UserSubscription.user_id == user_id,
-                UserSubscription.is_active == True
-            ).all()
-            for sub in existing_subscriptions:
-                sub.is_active = False
-
-            new_subscription = UserSubscription(
-                user_id=user_id,
-                plan_id=plan_id,
-                stripe_customer_id=session.customer,
-                stripe_subscription_id=subscription.id,
+            # Flag the player as premium; the UPDATE's row count doubles as the existence check
+            updated = self.db.execute(
+                update(Player)
+                .where(Player.id == user_id)
+                .values(is_premium=True, premium_since=datetime.now(_UTC), stripe_customer_id=session.customer)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not updated:
+                self.db.rollback()
+                logger.error("User not found: user_id=%s", user_id)
+                return None
+            self._premium_by_user.pop(user_id, None)
+
+            # Deactivate any existing subscriptions for this user in one UPDATE
+            self.db.execute(
+                update(UserSubscription)
+                .where(UserSubscription.user_id == user_id, UserSubscription.is_active.is_(True))
+                .values(is_active=False)
+                .execution_options(synchronize_session=False)
+            )
+
+            # Upsert on the Stripe subscription ID so a retried delivery racing this one
+            # updates the same row instead of failing on the unique constraint
+            values = dict(
                 status=SubscriptionStatus(subscription.status),
-                current_period_start=datetime.fromtimestamp(subscription.current_period_start),
-                current_period_end=datetime.fromtimestamp(subscription.current_period_end),
+                current_period_start=_from_stripe_timestamp(subscription.current_period_start),
+                current_period_end=_from_stripe_timestamp(subscription.current_period_end),
                 is_active=True,
             )
-            self.db.add(new_subscription)
-
-            user.is_premium = True
-            user.premium_since = datetime.utcnow()
-
+            new_subscription = self.db.execute(
+                pg_insert(UserSubscription)
+                .values(
+                    user_id=user_id,
+                    plan_id=plan_id,
+                    stripe_customer_id=session.customer,
+                    stripe_subscription_id=subscription.id,
+                    **values,
+                )
+                .on_conflict_do_update(
+                    index_elements=[UserSubscription.stripe_subscription_id],
+                    set_={**values, "updated_at": func.now()},
+                )
+                .returning(UserSubscription)
+            ).scalar_one()
+
+            # All three statements go out in this one transaction
             self.db.commit()
             return new_subscription
 
-        except stripe.error.StripeError as e:
-            self.db.rollback()
-            logger.error(f"Stripe error: {str(e)}")
-            return None
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error handling checkout completion: {str(e)}")
+            _raise_if_transient(e)
+            logger.error("Error handling checkout completion: %s", e)
             return None
 
-    def handle_subscription_updated(self, subscription_id: str) -> Optional[UserSubscription]:
+    async def handle_subscription_updated(self, subscription_id: str) -> Optional[UserSubscription]:
         """
         Handle subscription update events from Stripe.
         """
         try:
-            stripe_subscription = stripe.Subscription.retrieve(subscription_id)
+            stripe_subscription = await stripe_client.subscriptions.retrieve_async(subscription_id)
             subscription = self.get_subscription_by_stripe_id(subscription_id)
             if not subscription:
-                logger.error(f"Subscription not found: {subscription_id}")
+                logger.error("Subscription not found: %s", subscription_id)
                 return None
 
-            subscription.status = SubscriptionStatus(stripe_subscription.status)
-            subscription.current_period_start = datetime.fromtimestamp(stripe_subscription.current_period_start)
-            subscription.current_period_end = datetime.fromtimestamp(stripe_subscription.current_period_end)
-            if stripe_subscription.canceled_at:
-                subscription.canceled_at = datetime.fromtimestamp(stripe_subscription.canceled_at)
+            status = SubscriptionStatus(stripe_subscription.status)
+            period_start = _from_stripe_timestamp(stripe_subscription.current_period_start)
+            period_end = _from_stripe_timestamp(stripe_subscription.current_period_end)
+            canceled_at = (_from_stripe_timestamp(stripe_subscription.canceled_at)
+                           or _as_utc(subscription.canceled_at))
+            is_active = status in _ACTIVE_STATUSES
+
+            # Stripe sends updates for many field changes we don't store; skip the write if nothing we track moved
+            if (subscription.status, _as_utc(subscription.current_period_start), _as_utc(subscription.current_period_end),
+                    _as_utc(subscription.canceled_at), subscription.is_active) == (
+                    status, period_start, period_end, canceled_at, is_active):
+                return subscription
 
-            subscription.is_active = stripe_subscription.status in ["active", "trialing"]
+            subscription.status = status
+            subscription.current_period_start = period_start
+            subscription.current_period_end = period_end
+            subscription.canceled_at = canceled_at
+            subscription.is_active = is_active
 
-            user = self.player_service.get_player(subscription.user_id)
-            if user:
-                user.is_premium = subscription.is_active
+            self._set_premium(subscription.user_id, is_active)
 
             self.db.commit()
             return subscription
 
-        except stripe.error.StripeError as e:
-            self.db.rollback()
-            logger.error(f"Stripe error: {str(e)}")
-            return None
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error handling subscription update: {str(e)}")
+            _raise_if_transient(e)
+            logger.error("Error handling subscription update: %s", e)
             return None
 
     def handle_subscription_deleted(self, subscription_id: str) -> bool:
@@ -271,98 +777,115 @@ class PaymentService:
         try:
             subscription = self.get_subscription_by_stripe_id(subscription_id)
             if not subscription:
-                logger.error(f"Subscription not found: {subscription_id}")
+                logger.error("Subscription not found: %s", subscription_id)
                 return False
 
             subscription.is_active = False
             subscription.status = SubscriptionStatus.CANCELED
-            subscription.canceled_at = datetime.utcnow()
-
-            user = self.player_service.get_player(subscription.user_id)
-            if user:
-                has_active = self.db.query(UserSubscription).filter(
-                    UserSubscription.user_id == user.id,
-                    UserSubscription.is_active == True,
-                    UserSubscription.id != subscription.id
-                ).first() is not None
-                if not has_active:
-                    user.is_premium = False
+            subscription.canceled_at = datetime.now(_UTC)
+
+            # Premium iff another subscription is still active, decided inside one UPDATE
+            has_other_active = exists().where(
+                UserSubscription.user_id == subscription.user_id,
+                UserSubscription.is_active.is_(True),
+                UserSubscription.id != subscription.id
+            )
+            self._set_premium(subscription.user_id, has_other_active)
 
             self.db.commit()
             return True
 
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error handling subscription deletion: {str(e)}")
+            _raise_if_transient(e)
+            logger.error("Error handling subscription deletion: %s", e)
             return False
 
-    def cancel_subscription(self, user_id: str) -> bool:
+    async def cancel_subscription(self, user_id: str) -> bool:
         """
         Cancel a user's subscription.
         """
         subscription = self.get_user_subscription(user_id)
         if not subscription or not subscription.stripe_subscription_id:
-            logger.error(f"No active subscription found for user: {user_id}")
+            logger.error("No active subscription found for user: %s", user_id)
             return False
 
+        subscription_pk, stripe_subscription_id = subscription.id, subscription.stripe_subscription_id
+
         try:
-            stripe.Subscription.delete(subscription.stripe_subscription_id)
-            subscription.is_active = False
-            subscription.status = SubscriptionStatus.CANCELED
-            subscription.canceled_at = datetime.utcnow()
+            self._release_connection()
+            # Keyed on the subscription so a retried cancel replays the first response
+            await stripe_client.subscriptions.cancel_async(
+                stripe_subscription_id,
+                options={"idempotency_key": f"cancel-{stripe_subscription_id}"}
+            )
 
-            user = self.player_service.get_player(user_id)
-            if user:
-                user.is_premium = False
+            self.db.execute(
+                update(UserSubscription)
+                .where(UserSubscription.id == subscription_pk)
+                .values(is_active=False, status=SubscriptionStatus.CANCELED, canceled_at=datetime.now(_UTC))
+                .execution_options(synchronize_session=False)
+            )
+            self._set_premium(user_id, False)
 
             self.db.commit()
             return True
 
         except stripe.error.StripeError as e:
             self.db.rollback()
-            logger.error(f"Stripe error: {str(e)}")
+            logger.error("Stripe error: %s", e)
             return False
         except Exception as e:
             self.db.rollback()
-            logger.error(f"Error canceling subscription: {str(e)}")
+            logger.error("Error canceling subscription: %s", e)
             return False
 
-    def create_billing_portal_session(self, user_id: str, return_url: str) -> Optional[str]:
+    async def create_billing_portal_session(self, user_id: str, return_url: str) -> Optional[str]:
         """
         Create a Stripe billing portal session for managing subscriptions.
         """
         subscription = self.get_user_subscription(user_id)
         if not subscription or not subscription.stripe_customer_id:
-            logger.error(f"No subscription with customer ID found for user: {user_id}")
+            logger.error("No subscription with customer ID found for user: %s", user_id)
             return None
 
+        stripe_customer_id = subscription.stripe_customer_id
+
         try:
-            session = stripe.billing_portal.Session.create(
-                customer=subscription.stripe_customer_id,
-                return_url=return_url
-            )
+            self._release_connection()
+            session = await stripe_client.billing_portal.sessions.create_async(params={
+                "customer": stripe_customer_id,
+                "return_url": return_url
+            })
             return session.url
 
         except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
+            logger.error("Stripe error: %s", e)
             return None
 
     def is_premium(self, user_id: str) -> bool:
         """
         Check if a user has premium status.
+        Memoized for the life of the service, since one request may gate on it several times.
         """
-        user = self.player_service.get_player(user_id)
-        return user is not None and user.is_premium
+        is_premium = self._premium_by_user.get(user_id)
+        if is_premium is None:
+            is_premium = bool(self.db.execute(
+                select(Player.is_premium).where(Player.id == user_id)
+            ).scalar())
+            self._premium_by_user[user_id] = is_premium
+        return is_premium
 
     # --- Premium World and Upgrade Checkouts ---
 
-    def create_premium_world_checkout(
+    async def create_premium_world_checkout(
         self,
         user_id: str,
         world_data: Dict[str, Any],
         success_url: str,
         cancel_url: str,
-        price: float = 249.99
+        price: float = PREMIUM_WORLD_PRICE,
+        idempotency_key: Optional[str] = None
     ) -> str:
         """
         Create a Stripe checkout session for a one-time premium world purchase.
@@ -372,368 +895,588 @@ class PaymentService:
         if not user:
             raise ValueError("User not found")
 
-        try:
-            stripe_customer_id = self._get_or_create_customer(user)
-
-            price_obj = stripe.Price.create(
-                unit_amount=int(price * 100),
-                currency="usd",
-                product_data={
-                    "name": f"Premium World: {world_data.get('world_name', 'Custom World')}",
-                    "description": "One-time purchase for premium world creation"
-                }
-            )
-
-            checkout_session = stripe.checkout.Session.create(
-                customer=stripe_customer_id,
-                payment_method_types=["card"],
-                line_items=[{"price": price_obj.id, "quantity": 1}],
-                mode="payment",
-                success_url=f"{success_url}?session_id={{CHECKOUT_SESSION_ID}}",
-                cancel_url=cancel_url,
-                metadata={
-                    "user_id": user.id,
-                    "product_type": "premium_world",
-                    "world_name": world_data.get("world_name", ""),
-                    "world_description": (world_data.get("world_description", "")[:100]
-                                          if world_data.get("world_description") else ""),
-                    "world_genre": world_data.get("world_genre", "")
-                }
-            )
-            return checkout_session.url
+        world_name = world_data.get("world_name", "")
+        world_description = (world_data.get("world_description") or "")[:100]
+        world_genre = world_data.get("world_genre", "")
 
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
-            raise ValueError(f"Payment processing error: {str(e)}")
+        line_item = _one_time_line_item(
+            settings.STRIPE_PREMIUM_WORLD_PRICE_ID,
+            price,
+            PREMIUM_WORLD_PRICE,
+            name=f"Premium World: {world_data.get('world_name', 'Custom World')}",
+            description="One-time purchase for premium world creation"
+        )
+        return await self._create_checkout(user, success_url, cancel_url, CheckoutSpec(
+            mode="payment",
+            line_items=[line_item],
+            metadata={
+                "product_type": "premium_world",
+                "world_name": world_name,
+                "world_description": world_description,
+                "world_genre": world_genre
+            }
+        ), idempotency_key=idempotency_key)
 
-    def handle_premium_world_checkout_completed(self, session_id: str) -> Optional[str]:
+    async def handle_premium_world_checkout_completed(self, session) -> Union[str, bool, None]:
         """
         Handle a completed premium world checkout session.
-        Returns the created world's ID (as provided by world_service.create_world) or None.
+        Runs from process_stripe_event after the webhook is acknowledged, so world
+        provisioning is outside Stripe's response window.
+        Returns the created world's ID (as provided by world_service.create_world), True
+        when the session was already fulfilled, or None on failure.
         """
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
+            session_id = session.id
+            processed = self._get_processed_checkout(session_id)
+            if processed is not None:
+                return processed
+
             if session.metadata.get("product_type") != "premium_world":
-                logger.error(f"Not a premium world checkout: {session_id}")
+                logger.error("Not a premium world checkout: %s", session_id)
                 return None
 
             user_id = session.metadata.get("user_id")
             if not user_id:
-                logger.error(f"User ID not found in session metadata: {session_id}")
+                logger.error("User ID not found in session metadata: %s", session_id)
                 return None
 
-            user = self.player_service.get_player(user_id)
-            if not user:
-                logger.error(f"User not found: {user_id}")
-                return None
+            # Claimed in the same transaction create_world commits, so a retried
+            # delivery handled by another worker cannot provision a second world
+            if not self._claim_checkout(session_id):
+                logger.info("Premium world checkout already fulfilled: %s", session_id)
+                return True
 
-            from app.services.world_service import WorldService
-            world_service = WorldService(self.db)
-            world = world_service.create_world(
+            # No separate player lookup: the owner_id foreign key rejects unknown users
+            world = self.world_service.create_world(
                 owner_id=user_id,
                 name=session.metadata.get("world_name", "Premium World"),
                 description=session.metadata.get("world_description", ""),
-                genre=session.metadata.get("world_genre", ""),
-                is_premium=True,
-                price=249.99
+                settings={"genre": session.metadata.get("world_genre", ""), "is_premium": True}
             )
             if not world:
-                logger.error(f"Failed to create premium world for user: {user_id}")
+                logger.error("Failed to create premium world for user: %s", user_id)
                 return None
+            self._mark_checkout_processed(session_id, world.id)
             return world.id
 
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
-            return None
         except Exception as e:
-            logger.error(f"Error handling premium world checkout: {str(e)}")
+            self.db.rollback()
+            _raise_if_transient(e)
+            logger.error("Error handling premium world checkout: %s", e)
             return None
 
-    def create_zone_upgrade_checkout(
+    async def create_zone_upgrade_checkout(
         self,
         user_id: str,
         world_id: str,
         success_url: str,
         cancel_url: str,
-        price: float = 49.99
+        price: float = ZONE_UPGRADE_PRICE,
+        idempotency_key: Optional[str] = None
     ) -> str:
         """
         Create a checkout session for a world zone limit upgrade.
-        Assumes that the World model has a field `zone_limit_upgrades`.
         """
-        user = self.player_service.get_player(user_id)
-        if not user:
-            raise ValueError("User not found")
-
-        from app.services.world_service import WorldService
-        world_service = WorldService(self.db)
-        world = world_service.get_world(world_id)
-        if not world:
-            raise ValueError("World not found")
-        if world.owner_id != user_id:
-            raise ValueError("Only the world owner can purchase zone upgrades")
-
-        try:
-            stripe_customer_id = self._get_or_create_customer(user)
-
-            price_obj = stripe.Price.create(
-                unit_amount=int(price * 100),
-                currency="usd",
-                product_data={
-                    "name": f"Zone Limit Upgrade: {world.name}",
-                    "description": "Increase zone limit by 1 for your world"
-                }
-            )
-            checkout_session = stripe.checkout.Session.create(
-                customer=stripe_customer_id,
-                payment_method_types=["card"],
-                line_items=[{"price": price_obj.id, "quantity": 1}],
-                mode="payment",
-                success_url=f"{success_url}?session_id={{CHECKOUT_SESSION_ID}}",
-                cancel_url=cancel_url,
-                metadata={
-                    "user_id": user.id,
-                    "product_type": "zone_upgrade",
-                    "world_id": world_id
-                }
-            )
-            return checkout_session.url
-
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
-            raise ValueError(f"Payment processing error: {str(e)}")
+        user, _, world = self._load_upgrade_context(user_id, world_id=world_id)
+
+        line_item = _one_time_line_item(
+            settings.STRIPE_ZONE_UPGRADE_PRICE_ID,
+            price,
+            ZONE_UPGRADE_PRICE,
+            name=f"Zone Limit Upgrade: {world.name}",
+            description="Increase zone limit by 1 for your world"
+        )
+        return await self._create_checkout(user, success_url, cancel_url, CheckoutSpec(
+            mode="payment",
+            line_items=[line_item],
+            metadata={"product_type": "zone_upgrade", "world_id": world_id}
+        ), idempotency_key=idempotency_key)
 
-    def handle_zone_upgrade_checkout_completed(self, session_id: str) -> Optional[bool]:
+    async def handle_zone_upgrade_checkout_completed(self, session) -> Optional[bool]:
         """
         Handle a completed checkout session for a zone limit upgrade.
-        Assumes World model has a field `zone_limit_upgrades` and a computed property `total_zone_limit`.
+        The increment and the fulfilment record commit together, so concurrent or
+        repeated deliveries apply the upgrade exactly once.
         """
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
+            session_id = session.id
+            processed = self._get_processed_checkout(session_id)
+            if processed is not None:
+                return processed
+
             if session.metadata.get("product_type") != "zone_upgrade":
-                logger.error(f"Not a zone upgrade checkout: {session_id}")
+                logger.error("Not a zone upgrade checkout: %s", session_id)
                 return None
 
             world_id = session.metadata.get("world_id")
             user_id = session.metadata.get("user_id")
             if not world_id or not user_id:
-                logger.error(f"World ID or User ID missing in session metadata: {session_id}")
+                logger.error("World ID or User ID missing in session metadata: %s", session_id)
                 return None
 
-            from app.services.world_service import WorldService
-            world_service = WorldService(self.db)
-            world = world_service.get_world(world_id)
-            if not world:
-                logger.error(f"World not found: {world_id}")
-                return None
-            if world.owner_id != user_id:
-                logger.error(f"User {user_id} is not the owner of world {world_id}")
+            if not self._claim_checkout(session_id):
+                return True
+
+            # Atomic increment, restricted to a world the buyer owns
+            upgrades = self.db.execute(
+                update(World)
+                .where(World.id == world_id, World.owner_id == user_id)
+                .values(zone_limit_upgrades=World.zone_limit_upgrades + 1)
+                .returning(World.zone_limit_upgrades)
+                .execution_options(synchronize_session=False)
+            ).scalar()
+            if upgrades is None:
+                self.db.rollback()
+                logger.error("World %s not found or not owned by user %s", world_id, user_id)
                 return None
 
-            world.zone_limit_upgrades += 1
             self.db.commit()
+            self._mark_checkout_processed(session_id, True)
 
-            logger.info(f"Zone limit upgraded for world {world_id}. New limit: {world.total_zone_limit}")
+            logger.info("Zone limit upgraded for world %s. Upgrades purchased: %s", world_id, upgrades)
             return True
 
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
-            return None
         except Exception as e:
-            logger.error(f"Error handling zone upgrade checkout: {str(e)}")
+            self.db.rollback()
+            _raise_if_transient(e)
+            logger.error("Error handling zone upgrade checkout: %s", e)
             return None
 
-    def create_entity_limit_upgrade_checkout(
+    async def create_entity_limit_upgrade_checkout(
         self,
         user_id: str,
         zone_id: str,
         success_url: str,
         cancel_url: str,
-        price: float = 9.99
+        price: float = ENTITY_LIMIT_UPGRADE_PRICE,
+        idempotency_key: Optional[str] = None
     ) -> str:
         """
         Create a checkout session for a zone's entity limit upgrade.
-        Assumes Zone model has fields `entity_limit_upgrades` and a property `total_entity_limit`.
+        Fulfilment increments Zone.entity_limit_upgrades.
         """
-        user = self.player_service.get_player(user_id)
-        if not user:
-            raise ValueError("User not found")
-
-        from app.services.zone_service import ZoneService
-        zone_service = ZoneService(self.db)
-        zone = zone_service.get_zone(zone_id)
-        if not zone:
-            raise ValueError("Zone not found")
-
-        from app.services.world_service import WorldService
-        world_service = WorldService(self.db)
-        world = world_service.get_world(zone.world_id)
-        if not world or world.owner_id != user_id:
-            raise ValueError("Only the world owner can purchase entity limit upgrades")
-
-        try:
-            stripe_customer_id = self._get_or_create_customer(user)
-
-            price_obj = stripe.Price.create(
-                unit_amount=int(price * 100),
-                currency="usd",
-                product_data={
-                    "name": f"Entity Limit Upgrade: {zone.name}",
-                    "description": "Increase entity limit by 10 for your zone"
-                }
-            )
-            checkout_session = stripe.checkout.Session.create(
-                customer=stripe_customer_id,
-                payment_method_types=["card"],
-                line_items=[{"price": price_obj.id, "quantity": 1}],
-                mode="payment",
-                success_url=f"{success_url}?session_id={{CHECKOUT_SESSION_ID}}",
-                cancel_url=cancel_url,
-                metadata={
-                    "user_id": user.id,
-                    "product_type": "entity_limit_upgrade",
-                    "zone_id": zone_id
-                }
-            )
-            return checkout_session.url
-
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
-            raise ValueError(f"Payment processing error: {str(e)}")
+        user, zone, _ = self._load_upgrade_context(user_id, zone_id=zone_id)
+
+        line_item = _one_time_line_item(
+            settings.STRIPE_ENTITY_LIMIT_UPGRADE_PRICE_ID,
+            price,
+            ENTITY_LIMIT_UPGRADE_PRICE,
+            name=f"Entity Limit Upgrade: {zone.name}",
+            description="Increase entity limit by 10 for your zone"
+        )
+        return await self._create_checkout(user, success_url, cancel_url, CheckoutSpec(
+            mode="payment",
+            line_items=[line_item],
+            metadata={"product_type": "entity_limit_upgrade", "zone_id": zone_id}
+        ), idempotency_key=idempotency_key)
 
-    def handle_entity_limit_upgrade_checkout_completed(self, session_id: str) -> Optional[bool]:
+    async def handle_entity_limit_upgrade_checkout_completed(self, session) -> Optional[bool]:
         """
         Handle a completed checkout session for an entity limit upgrade.
+        The increment and the fulfilment record commit together, so concurrent or
+        repeated deliveries apply the upgrade exactly once.
         """
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
+            session_id = session.id
+            processed = self._get_processed_checkout(session_id)
+            if processed is not None:
+                return processed
+
             if session.metadata.get("product_type") != "entity_limit_upgrade":
-                logger.error(f"Not an entity limit upgrade checkout: {session_id}")
+                logger.error("Not an entity limit upgrade checkout: %s", session_id)
                 return None
 
             zone_id = session.metadata.get("zone_id")
             user_id = session.metadata.get("user_id")
             if not zone_id or not user_id:
-                logger.error(f"Zone ID or User ID missing in session metadata: {session_id}")
+                logger.error("Zone ID or User ID missing in session metadata: %s", session_id)
                 return None
 
-            from app.services.zone_service import ZoneService
-            zone_service = ZoneService(self.db)
-            zone = zone_service.get_zone(zone_id)
-            if not zone:
-                logger.error(f"Zone not found: {zone_id}")
+            if not self._claim_checkout(session_id):
+                return True
+
+            # Atomic increment, restricted to zones in a world the buyer owns
+            owned_world_ids = select(World.id).where(World.owner_id == user_id)
+            upgrades = self.db.execute(
+                update(Zone)
+                .where(Zone.id == zone_id, Zone.world_id.in_(owned_world_ids))
+                .values(entity_limit_upgrades=Zone.entity_limit_upgrades + 1)
+                .returning(Zone.entity_limit_upgrades)
+                .execution_options(synchronize_session=False)
+            ).scalar()
+            if upgrades is None:
+                self.db.rollback()
+                logger.error("Zone %s not found or not owned by user %s", zone_id, user_id)
                 return None
 
-            from app.services.world_service import WorldService
-            world_service = WorldService(self.db)
-            world = world_service.get_world(zone.world_id)
-            if not world or world.owner_id != user_id:
-                logger.error(f"User {user_id} is not the owner of this zone's world")
-                return None
-
-            zone.entity_limit_upgrades += 1
             self.db.commit()
+            self._mark_checkout_processed(session_id, True)
 
-            logger.info(f"Entity limit upgraded for zone {zone_id}. New limit: {zone.total_entity_limit}")
+            logger.info("Entity limit upgraded for zone %s. Upgrades purchased: %s", zone_id, upgrades)
             return True
 
-        except stripe.error.StripeError as e:
-            logger.error(f"Stripe error: {str(e)}")
-            return None
         except Exception as e:
-            logger.error(f"Error handling entity limit upgrade checkout: {str(e)}")
+            self.db.rollback()
+            _raise_if_transient(e)
+            logger.error("Error handling entity limit upgrade checkout: %s", e)
             return None
 
-    # --- Tier Upgrade Checkouts for Entities, Characters, and Objects ---
+    # --- Tier Upgrade Checkouts ---
+
+    async def create_world_tier_upgrade_checkout(
+        self,
+        user_id: str,
+        world_id: str,
+        success_url: str,
+        cancel_url: str,
+        price: float = TIER_UPGRADE_PRICE,
+        idempotency_key: Optional[str] = None
+    ) -> str:
+        """
+        Create a checkout session for a world tier upgrade.
+        """
+        _, _, world = self._load_upgrade_context(user_id, world_id=world_id)
+        return await self.create_tier_upgrade_checkout_base(
+            user_id=user_id,
+            resource_id=world_id,
+            resource_type="world",
+            resource_name=world.name,
+            success_url=success_url,
+            cancel_url=cancel_url,
+            price=price,
+            idempotency_key=idempotency_key
+        )
+
+    async def create_zone_tier_upgrade_checkout(
+        self,
+        user_id: str,
+        zone_id: str,
+        success_url: str,
+        cancel_url: str,
+        price: float = TIER_UPGRADE_PRICE,
+        idempotency_key: Optional[str] = None
+    ) -> str:
+        """
+        Create a checkout session for a zone tier upgrade.
+        """
+        _, zone, _ = self._load_upgrade_context(user_id, zone_id=zone_id)
+        return await self.create_tier_upgrade_checkout_base(
+            user_id=user_id,
+            resource_id=zone_id,
+            resource_type="zone",
+            resource_name=zone.name,
+            success_url=success_url,
+            cancel_url=cancel_url,
+            price=price,
+            idempotency_key=idempotency_key
+        )
 
-    def create_entity_tier_upgrade_checkout(
+    async def create_entity_tier_upgrade_checkout(
         self, 
         user_id: str,
         entity_id: str,
         success_url: str, 
         cancel_url: str,
-        price: float = 4.99
+        price: float = TIER_UPGRADE_PRICE,
+        idempotency_key: Optional[str] = None
     ) -> str:
         """
         Create a checkout session for an entity tier upgrade.
         This uses the base helper after verifying ownership.
         """
-        from app.services.entity_service import EntityService
-        entity_service = EntityService(self.db)
-        entity = entity_service.get_entity(entity_id)
-        if not entity:
-            raise ValueError("Entity not found")
-        self._verify_entity_ownership(entity, user_id)
-        return self.create_tier_upgrade_checkout_base(
+        entity = self._get_owned_entity(entity_id, user_id)
+        return await self.create_tier_upgrade_checkout_base(
             user_id=user_id,
             resource_id=entity_id,
             resource_type="entity",
             resource_name=entity.name,
             success_url=success_url,
             cancel_url=cancel_url,
-            price=price
+            price=price,
+            idempotency_key=idempotency_key
         )
 
-    def create_character_tier_upgrade_checkout(
+    async def create_character_tier_upgrade_checkout(
         self, 
         user_id: str,
         character_id: str,
         success_url: str, 
         cancel_url: str,
-        price: float = 4.99
+        price: float = TIER_UPGRADE_PRICE,
+        idempotency_key: Optional[str] = None
     ) -> str:
         """
         Create a checkout session for a character tier upgrade.
         """
-        from app.services.character_service import CharacterService
-        character_service = CharacterService(self.db)
-        character = character_service.get_character(character_id)
+        character = self.character_service.get_character(character_id)
         if not character:
             raise ValueError("Character not found")
         if character.player_id != user_id:
             raise ValueError("You can only upgrade your own characters")
-        if not character.entity_id:
-            raise ValueError("Character cannot be upgraded (no associated entity)")
-        return self.create_tier_upgrade_checkout_base(
+        return await self.create_tier_upgrade_checkout_base(
             user_id=user_id,
             resource_id=character_id,
             resource_type="character",
             resource_name=character.name,
             success_url=success_url,
             cancel_url=cancel_url,
-            price=price
+            price=price,
+            idempotency_key=idempotency_key
         )
 
-    def create_object_tier_upgrade_checkout(
+    async def create_object_tier_upgrade_checkout(
         self, 
         user_id: str,
         object_id: str,
         success_url: str, 
         cancel_url: str,
-        price: float = 4.99
+        price: float = TIER_UPGRADE_PRICE,
+        idempotency_key: Optional[str] = None
     ) -> str:
         """
         Create a checkout session for an object tier upgrade.
         """
-        from app.services.object_service import ObjectService
-        object_service = ObjectService(self.db)
-        obj = object_service.get_object(object_id)
-        if not obj:
+        # Objects are entities (joined inheritance), so the object ID is the entity ID
+        obj = self._get_owned_entity(object_id, user_id)
+        if obj.type != EntityType.OBJECT.value:
             raise ValueError("Object not found")
-        if not obj.entity_id:
-            raise ValueError("Object cannot be upgraded (no associated entity)")
-        from app.services.entity_service import EntityService
-        entity_service = EntityService(self.db)
-        entity = entity_service.get_entity(obj.entity_id)
-        if not entity:
-            raise ValueError("Object's entity not found")
-        self._verify_entity_ownership(entity, user_id)
-        return self.create_tier_upgrade_checkout_base(
+        return await self.create_tier_upgrade_checkout_base(
             user_id=user_id,
             resource_id=object_id,
             resource_type="object",
             resource_name=obj.name,
             success_url=success_url,
             cancel_url=cancel_url,
-            price=price
+            price=price,
+            idempotency_key=idempotency_key
         )
+
+
+    async def handle_tier_upgrade_checkout_completed(self, session) -> Optional[bool]:
+        """
+        Handle a completed tier upgrade checkout for a world, zone, entity, character or object.
+        Characters and objects are entities, so every upgrade is a single tier increment.
+        """
+        try:
+            session_id = session.id
+            processed = self._get_processed_checkout(session_id)
+            if processed is not None:
+                return processed
+
+            pending = self.db.get(PendingUpgrade, session_id)
+            if pending:
+                # Claim the upgrade; a duplicate delivery finds it already completed
+                claimed = self.db.execute(
+                    update(PendingUpgrade)
+                    .where(PendingUpgrade.session_id == session_id, PendingUpgrade.completed_at.is_(None))
+                    .values(completed_at=datetime.now(_UTC))
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if not claimed:
+                    self.db.rollback()
+                    return True
+                resource_type, resource_id = pending.resource_type, pending.resource_id
+            else:
+                # Sessions created before pending upgrades were recorded
+                product_type = session.metadata.get("product_type") or ""
+                resource_type = product_type[:-len("_tier_upgrade")]
+                resource_id = session.metadata.get(f"{resource_type}_id")
+                if not product_type.endswith("_tier_upgrade") or not resource_id:
+                    logger.error("Not a tier upgrade checkout: %s", session_id)
+                    return None
+
+            model = _TIER_UPGRADE_MODELS.get(resource_type, Entity)
+            updated = self.db.execute(
+                update(model)
+                .where(model.id == resource_id)
+                .values(tier=model.tier + 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not updated:
+                self.db.rollback()
+                logger.error("%s not found for tier upgrade: %s", resource_type, resource_id)
+                return None
+
+            self.db.commit()
+            self._mark_checkout_processed(session_id, True)
+            logger.info("Tier upgraded for %s %s", resource_type, resource_id)
+            return True
+
+        except Exception as e:
+            self.db.rollback()
+            _raise_if_transient(e)
+            logger.error("Error handling tier upgrade checkout: %s", e)
+            return None
+
+
+def record_stripe_event(event, payload: bytes) -> bool:
+    """
+    Persist a verified webhook event so it can be applied after the webhook is acknowledged.
+    Returns True if the event is new and should be processed now; a redelivery of an event
+    already on record is left to the sweeper. Events of a type this service ignores are not stored.
+    """
+    if event["type"] not in _HANDLED_EVENT_TYPES:
+        return False
+
+    with SessionLocal() as db:
+        inserted = db.execute(
+            pg_insert(StripeEvent)
+            .values(event_id=event["id"], event_type=event["type"], payload=payload.decode("utf-8"))
+            .on_conflict_do_nothing(index_elements=[StripeEvent.event_id])
+            .returning(StripeEvent.event_id)
+        ).scalar()
+        db.commit()
+    return inserted is not None
+
+
+def _finish_stripe_event(db: Session, event_id: str, error: Optional[str] = None) -> None:
+    """
+    Close a webhook event so redeliveries are skipped.
+    An error marks it as failed for good: retrying would not change the outcome.
+    """
+    db.execute(
+        update(StripeEvent)
+        .where(StripeEvent.event_id == event_id)
+        .values(processed_at=datetime.now(_UTC), last_error=error)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
+def _defer_stripe_event(db: Session, event_id: str, error: str) -> None:
+    """
+    Count a transient failure and leave the event open for the sweeper.
+    After STRIPE_EVENT_MAX_ATTEMPTS failures the event is closed as failed.
+    """
+    attempts = db.execute(
+        update(StripeEvent)
+        .where(StripeEvent.event_id == event_id)
+        .values(attempts=StripeEvent.attempts + 1, last_error=error)
+        .returning(StripeEvent.attempts)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    db.commit()
+    if attempts is not None and attempts >= STRIPE_EVENT_MAX_ATTEMPTS:
+        logger.error("Giving up on Stripe event %s after %s attempts: %s", event_id, attempts, error)
+        _finish_stripe_event(db, event_id, error)
+
+
+async def _dispatch_stripe_event(payment_service: PaymentService, event) -> Any:
+    """
+    Run the handler for a webhook event.
+    Returns a falsy result when the event cannot be applied (bad metadata, unknown
+    or unowned resources); transient failures raise RetryableStripeEventError.
+    """
+    event_type = event["type"]
+    obj = event["data"]["object"]
+    if event_type == "checkout.session.completed":
+        return await payment_service.handle_checkout_completed(obj)
+
+    if event_type == "customer.subscription.updated":
+        # The handler fetches current state, so an older or repeated event adds nothing
+        if _subscription_events.is_stale(obj.id, event["created"], event["id"]):
+            return True
+        result = await payment_service.handle_subscription_updated(obj.id)
+        if result:
+            _subscription_events.record(obj.id, event["created"], event["id"])
+        return result
+
+    if event_type == "customer.subscription.deleted":
+        return payment_service.handle_subscription_deleted(obj.id)
+
+    return True
+
+
+async def process_stripe_event(event_id: str) -> None:
+    """
+    Apply a recorded webhook event with its own session. Runs after the webhook was
+    acknowledged: as a background task for new events, and from the sweeper for the rest.
+    Events that cannot be applied are logged and closed with last_error, since another
+    attempt would fail the same way. Transient failures (database or Stripe unreachable)
+    leave the event open for the sweeper.
+    """
+    with SessionLocal() as db:
+        payment_service = PaymentService(db)
+        try:
+            record = db.get(StripeEvent, event_id)
+            if record is None or record.processed_at is not None:
+                return
+            event_type = record.event_type
+            payload = record.payload
+
+            error = None
+            try:
+                if payload is None:
+                    # Recorded before payloads were stored; nothing to replay
+                    error = "No payload recorded"
+                else:
+                    event = stripe.Event.construct_from(json.loads(payload), stripe.api_key)
+                    result = await _dispatch_stripe_event(payment_service, event)
+                    if not result:
+                        error = "Handler could not apply the event"
+            except RetryableStripeEventError:
+                raise
+            except Exception as e:
+                db.rollback()
+                _raise_if_transient(e)
+                logger.exception("Unexpected error handling Stripe event %s (%s)", event_id, event_type)
+                error = str(e) or type(e).__name__
+
+            if error:
+                logger.error("Stripe event %s (%s) failed permanently: %s", event_id, event_type, error)
+            _finish_stripe_event(db, event_id, error)
+
+        except (RetryableStripeEventError, *_TRANSIENT_ERRORS) as e:
+            db.rollback()
+            logger.warning("Transient failure handling Stripe event %s, will retry: %s", event_id, e)
+            try:
+                _defer_stripe_event(db, event_id, str(e))
+            except Exception as defer_error:
+                # The sweeper still finds the event open; only the attempt count is lost
+                db.rollback()
+                logger.error("Could not record failure of Stripe event %s: %s", event_id, defer_error)
+
+
+def _lease_stripe_events(db: Session, limit: int) -> List[str]:
+    """
+    Claim open events that have been idle for a sweep interval.
+    Bumping updated_at hides them from other workers' sweeps while they are processed.
+    """
+    cutoff = datetime.now(_UTC) - timedelta(seconds=STRIPE_EVENT_SWEEP_INTERVAL_SECONDS)
+    due = (
+        select(StripeEvent.event_id)
+        .where(StripeEvent.processed_at.is_(None), StripeEvent.updated_at < cutoff)
+        .order_by(StripeEvent.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    event_ids = db.execute(
+        update(StripeEvent)
+        .where(StripeEvent.event_id.in_(due))
+        .values(updated_at=func.now())
+        .returning(StripeEvent.event_id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    db.commit()
+    return event_ids
+
+
+async def drain_stripe_events(limit: int = 100) -> int:
+    """Process open webhook events left behind by failed or interrupted attempts; returns how many were picked up."""
+    with SessionLocal() as db:
+        event_ids = _lease_stripe_events(db, limit)
+    for event_id in event_ids:
+        await process_stripe_event(event_id)
+    return len(event_ids)
+
+
+async def run_stripe_event_sweeper() -> None:
+    """Drain open webhook events every STRIPE_EVENT_SWEEP_INTERVAL_SECONDS (started with the app)."""
+    while True:
+        try:
+            drained = await drain_stripe_events()
+            if drained:
+                logger.info("Retried %s open Stripe events", drained)
+        except Exception as e:
+            logger.error("Stripe event sweep failed: %s", e)
+        await asyncio.sleep(STRIPE_EVENT_SWEEP_INTERVAL_SECONDS)